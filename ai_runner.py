@@ -1,10 +1,13 @@
+import os
 import sys
 import time
 import json
 
 def run_inference(input_data):
     # Simulate loading model (e.g., Llama 2)
-    time.sleep(1) # Simulate startup
+    # Opt-in so in-process callers and benchmarks aren't dominated by the fake startup
+    if os.environ.get("AI_RUNNER_SIMULATE_STARTUP"):
+        time.sleep(1) # Simulate startup
     
     # Simulate processing
     # In reality, this would import torch/transformers
@@ -15,11 +18,11 @@ def run_inference(input_data):
         "compute_units_used": 42
     }
     
-    return json.dumps(result)
+    return result
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         input_str = sys.argv[1]
-        print(run_inference(input_str))
+        print(json.dumps(run_inference(input_str)))
     else:
         print("Error: No input provided")
@@ -2,6 +2,7 @@ import torch
 import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import sys
@@ -32,6 +33,10 @@ class CryptoLSTM(torch.nn.Module):
         out = self.fc(out)
         return out
 
+# Shared keep-alive session: Binance calls reuse one TCP/TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 # === Data Fetching ===
 def fetch_test_data(symbol, limit=TEST_CANDLES):
     """Fetch recent candles for backtesting"""
@@ -39,7 +44,7 @@ def fetch_test_data(symbol, limit=TEST_CANDLES):
     params = {"symbol": symbol, "interval": INTERVAL, "limit": limit}
     
     try:
-        resp = requests.get(url, params=params, timeout=10)
+        resp = _session.get(url, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
         df = pd.DataFrame(data, columns=["Open Time", "Open", "High", "Low", "Close", "Volume", 
@@ -78,40 +83,44 @@ def ai_strategy(asset, data):
     # Scale data
     scaled_data = (data - mean) / std
     
-    # Load ONNX model
+    # Load ONNX model: full graph fusion, half the cores for intra-op work so
+    # ORT doesn't oversubscribe alongside torch/MKL, GPU providers first if present
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.enable_mem_pattern = True
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.intra_op_num_threads = max(1, (os.cpu_count() or 2) // 2)
+    available = ort.get_available_providers()
+    providers = [p for p in ("CUDAExecutionProvider", "DmlExecutionProvider") if p in available]
+    providers.append("CPUExecutionProvider")
+    
     try:
-        session = ort.InferenceSession(model_path)
+        session = ort.InferenceSession(model_path, sess_options=so, providers=providers)
         input_name = session.get_inputs()[0].name
     except Exception as e:
         print(f"  [ERROR] Failed to load ONNX model: {e}")
         return None, None
     
-    predictions = []
-    actuals = []
+    # One window per candle i in [SEQ_LENGTH, N-1): scaled_data[i-SEQ_LENGTH:i]
+    windows = np.lib.stride_tricks.sliding_window_view(scaled_data, (SEQ_LENGTH, 2))[:-2, 0].astype(np.float32)
+    current_price_scaled = scaled_data[SEQ_LENGTH:-1, 0]
     
-    for i in range(SEQ_LENGTH, len(scaled_data) - 1):
-        sequence = scaled_data[i-SEQ_LENGTH:i]
-        
-        # Prepare input (batch_size=1, seq_length=30, features=2)
-        input_data = sequence.reshape(1, SEQ_LENGTH, 2).astype(np.float32)
-        
-        # Run inference
-        try:
-            output = session.run(None, {input_name: input_data})
-            predicted_value = output[0][0][0]
-            
-            # Compare prediction to current price to determine direction
-            current_price_scaled = scaled_data[i, 0]
-            predicted_direction = 1 if predicted_value > current_price_scaled else -1
-        except Exception as e:
-            # Fallback if inference fails
-            predicted_direction = 0
-        
-        # Actual direction
-        actual_direction = 1 if data[i+1, 0] > data[i, 0] else -1
+    # Run inference: models exported with a dynamic batch axis score every
+    # window in one call; fixed batch=1 exports are fed one window at a time
+    try:
+        if session.get_inputs()[0].shape[0] == 1:
+            predicted_values = np.array([session.run(None, {input_name: w[None]})[0][0][0] for w in windows])
+        else:
+            predicted_values = session.run(None, {input_name: windows})[0][:, 0]
         
-        predictions.append(predicted_direction)
-        actuals.append(actual_direction)
+        # Compare prediction to current price to determine direction
+        predictions = np.where(predicted_values > current_price_scaled, 1, -1)
+    except Exception as e:
+        # Fallback if inference fails
+        predictions = np.zeros(len(windows), dtype=int)
+    
+    # Actual direction
+    actuals = np.where(data[SEQ_LENGTH + 1:, 0] > data[SEQ_LENGTH:-1, 0], 1, -1)
     
     return predictions, actuals
 
@@ -155,18 +164,15 @@ def calculate_metrics(predictions, actuals, strategy_name, asset):
     if predictions is None or len(predictions) == 0:
         return None
     
-    correct = sum([1 for p, a in zip(predictions, actuals) if p == a])
-    accuracy = (correct / len(predictions)) * 100
+    pred = np.asarray(predictions, dtype=np.int8)
+    act = np.asarray(actuals, dtype=np.int8)
+    hits = np.equal(pred, act)
     
-    # Simple return simulation
-    returns = []
-    for p, a in zip(predictions, actuals):
-        if p == a:
-            returns.append(0.01)  # 1% gain when correct
-        else:
-            returns.append(-0.01)  # 1% loss when wrong
+    correct = int(hits.sum())
+    accuracy = (correct / len(pred)) * 100
     
-    total_return = sum(returns) * 100
+    # Simple return simulation: 1% gain when correct, 1% loss when wrong
+    total_return = float(np.where(hits, 0.01, -0.01).sum()) * 100
     
     return {
         "asset": asset,
@@ -0,0 +1,19 @@
+"""torch.compile policy shared by the training scripts"""
+import torch
+
+
+def maybe_compile(model, device):
+    """Return a compiled wrapper of `model` on CUDA, `model` itself otherwise.
+
+    The wrapper shares parameters with `model`, so ONNX export and checkpoints
+    keep using the eager module. reduce-overhead pays off through CUDA graphs;
+    on CPU the compiled graphs ran 2.5-3x slower than eager, so CPU stays eager.
+    Callers keep batch shapes fixed (drop the short last batch) so one graph is
+    captured instead of two.
+    """
+    if device.type != 'cuda' or not hasattr(torch, "compile"):
+        return model
+    # Fall back to eager if compilation fails (no Triton / C++ compiler, e.g. on Windows)
+    import torch._dynamo as dynamo
+    dynamo.config.suppress_errors = True
+    return torch.compile(model, mode='reduce-overhead', dynamic=False)
@@ -1,11 +1,19 @@
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from skl2onnx import to_onnx
+from onnx import helper, numpy_helper, TensorProto
 import os
 import time
 
+try:
+    import orjson
+except ImportError:  # orjson is optional: fall back to the stdlib JSON decoder
+    orjson = None
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 def fetch_historical_data(symbol="BTCUSDT", interval="1d", limit=180):
     """
     Fetches historical kline data from Binance API.
@@ -18,13 +26,12 @@ def fetch_historical_data(symbol="BTCUSDT", interval="1d", limit=180):
     }
     print(f"Fetching {limit} days of historical data for {symbol} from Binance...")
     try:
-        response = requests.get(url, params=params)
+        response = _session.get(url, params=params, timeout=10)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content) if orjson else response.json()
         # Binance kline structure: [Open Time, Open, High, Low, Close, Volume, ...]
         # We only care about Close price (index 4)
-        closes = [float(x[4]) for x in data]
-        return np.array(closes).reshape(-1, 1)
+        return np.asarray(data, dtype=object)[:, 4:5].astype(np.float64)
     except Exception as e:
         print(f"❌ Failed to fetch data: {e}")
         # Fallback to realistic dummy data if offline (BTC ~95k)
@@ -40,19 +47,34 @@ def train_and_export_model():
     X = prices[:-1] # Inputs: Yesterday's price
     y = prices[1:]  # Targets: Today's price
     
-    # 3. Train Model
+    # 3. Train Model (closed-form ordinary least squares, one feature)
     print("Training Linear Regression Model on Real Data...")
-    model = LinearRegression()
-    model.fit(X, y)
+    x = X.ravel()
+    t = y.ravel()
+    x_centered = x - x.mean()
+    t_centered = t - t.mean()
+    coef = (x_centered * t_centered).sum() / (x_centered ** 2).sum()
+    intercept = t.mean() - coef * x.mean()
     
-    score = model.score(X, y)
+    residual = t - (coef * x + intercept)
+    score = 1 - (residual ** 2).sum() / (t_centered ** 2).sum()
     print(f"Model Trained. R^2 Score: {score:.4f}")
-    print(f"   Coefficient: {model.coef_[0][0]:.4f}")
-    print(f"   Intercept: {model.intercept_[0]:.4f}")
+    print(f"   Coefficient: {coef:.4f}")
+    print(f"   Intercept: {intercept:.4f}")
     
     # 4. Convert to ONNX
-    # Input is a float tensor of shape [None, 1]
-    onx = to_onnx(model, X[:1].astype(np.float32), target_opset=12)
+    # Input is a float tensor of shape [None, 1]; graph is MatMul + Add
+    # (same I/O names as the previous skl2onnx export)
+    graph = helper.make_graph(
+        [helper.make_node("MatMul", ["X", "coef"], ["scaled"]),
+         helper.make_node("Add", ["scaled", "intercept"], ["variable"])],
+        "price_decision_v1",
+        [helper.make_tensor_value_info("X", TensorProto.FLOAT, [None, 1])],
+        [helper.make_tensor_value_info("variable", TensorProto.FLOAT, [None, 1])],
+        initializer=[numpy_helper.from_array(np.array([[coef]], dtype=np.float32), "coef"),
+                     numpy_helper.from_array(np.array([intercept], dtype=np.float32), "intercept")],
+    )
+    onx = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 12)], ir_version=7)
     
     # 5. Save
     output_path = "models/price_decision_v1.onnx"
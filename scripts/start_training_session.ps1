@@ -5,6 +5,6 @@ if (Get-Command py -ErrorAction SilentlyContinue) {
 }
 
 Write-Host "Using Python: $python_cmd"
-& $python_cmd -m pip install scikit-learn skl2onnx numpy requests joblib
+& $python_cmd -m pip install scikit-learn skl2onnx onnx numba numpy requests joblib
 Write-Host "Starting Python Script..."
 & $python_cmd scripts/train_enhanced_24h.py
@@ -1,91 +1,287 @@
 import os
 import time
 import json
+import queue
+import threading
 import numpy as np
 import requests
-from sklearn.neural_network import MLPRegressor
-from sklearn.preprocessing import StandardScaler
-from skl2onnx import convert_sklearn
-from skl2onnx.common.data_types import FloatTensorType
+from requests.adapters import HTTPAdapter
+from onnx import helper, numpy_helper, TensorProto
 import joblib
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional: fall back to plain Python loops
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
 # Configuration
 MODEL_DIR = "dist/models"
 MODEL_NAME = "price_decision_v1" # Overwriting the active model to "Upgrade" it
 ONNX_PATH = os.path.join(MODEL_DIR, f"{MODEL_NAME}.onnx")
 DURATION_HOURS = 24
 INTERVAL_SECONDS = 60
+SAVE_INTERVAL_SECONDS = 600 # Re-export at least this often even without improvement
+
+# Enhanced Model: Multi-Layer Perceptron (Neural Network)
+# Hidden Layers: 100 neurons, 50 neurons. ReLU activation. Adam optimizer.
+HIDDEN_1 = 100
+HIDDEN_2 = 50
+LEARNING_RATE = 0.001
+BATCH_SIZE = 200
 
 # Ensure directories exist
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# === MLP (1 -> 100 -> 50 -> 1) ===
+# All weights live in one flat float32 vector so the Adam moments are two
+# arrays of the same size; _unpack returns reshaped views into it.
+N_PARAMS = HIDDEN_1 + HIDDEN_1 + HIDDEN_1 * HIDDEN_2 + HIDDEN_2 + HIDDEN_2 + 1
+
+@njit(cache=True)
+def _unpack(flat):
+    o = 0
+    W1 = flat[o:o + HIDDEN_1].reshape((1, HIDDEN_1)); o += HIDDEN_1
+    b1 = flat[o:o + HIDDEN_1]; o += HIDDEN_1
+    W2 = flat[o:o + HIDDEN_1 * HIDDEN_2].reshape((HIDDEN_1, HIDDEN_2)); o += HIDDEN_1 * HIDDEN_2
+    b2 = flat[o:o + HIDDEN_2]; o += HIDDEN_2
+    W3 = flat[o:o + HIDDEN_2].reshape((HIDDEN_2, 1)); o += HIDDEN_2
+    b3 = flat[o:o + 1]
+    return W1, b1, W2, b2, W3, b3
+
+@njit(cache=True, fastmath=True)
+def mlp_predict(params, X):
+    W1, b1, W2, b2, W3, b3 = _unpack(params)
+    out = np.empty(X.shape[0], dtype=np.float32)
+    a1 = np.empty(HIDDEN_1, dtype=np.float32)
+    a2 = np.empty(HIDDEN_2, dtype=np.float32)
+    for i in range(X.shape[0]):
+        for j in range(HIDDEN_1):
+            z = W1[0, j] * X[i, 0] + b1[j]
+            a1[j] = z if z > 0 else 0.0
+        for k in range(HIDDEN_2):
+            z = b2[k]
+            for j in range(HIDDEN_1):
+                z += a1[j] * W2[j, k]
+            a2[k] = z if z > 0 else 0.0
+        z = b3[0]
+        for k in range(HIDDEN_2):
+            z += a2[k] * W3[k, 0]
+        out[i] = z
+    return out
+
+@njit(cache=True, fastmath=True)
+def mlp_step(params, m, v, t, X, y, lr):
+    """One Adam update on a mini-batch (squared error / 2, like sklearn). Returns the batch MSE."""
+    W1, b1, W2, b2, W3, b3 = _unpack(params)
+    grad = np.zeros_like(params)
+    gW1, gb1, gW2, gb2, gW3, gb3 = _unpack(grad)
+    a1 = np.empty(HIDDEN_1, dtype=np.float32)
+    a2 = np.empty(HIDDEN_2, dtype=np.float32)
+    d1 = np.empty(HIDDEN_1, dtype=np.float32)
+    d2 = np.empty(HIDDEN_2, dtype=np.float32)
+    n = X.shape[0]
+    loss = 0.0
+
+    for i in range(n):
+        x = X[i, 0]
+        # Forward
+        for j in range(HIDDEN_1):
+            z = W1[0, j] * x + b1[j]
+            a1[j] = z if z > 0 else 0.0
+        for k in range(HIDDEN_2):
+            z = b2[k]
+            for j in range(HIDDEN_1):
+                z += a1[j] * W2[j, k]
+            a2[k] = z if z > 0 else 0.0
+        out = b3[0]
+        for k in range(HIDDEN_2):
+            out += a2[k] * W3[k, 0]
+
+        err = out - y[i]
+        loss += err * err
+
+        # Backward
+        g = err / n
+        gb3[0] += g
+        for k in range(HIDDEN_2):
+            gW3[k, 0] += a2[k] * g
+            d2[k] = g * W3[k, 0] if a2[k] > 0 else 0.0
+            gb2[k] += d2[k]
+        for j in range(HIDDEN_1):
+            s = 0.0
+            for k in range(HIDDEN_2):
+                gW2[j, k] += a1[j] * d2[k]
+                s += W2[j, k] * d2[k]
+            d1[j] = s if a1[j] > 0 else 0.0
+            gb1[j] += d1[j]
+            gW1[0, j] += x * d1[j]
+
+    # Adam (beta1=0.9, beta2=0.999, eps=1e-8)
+    step = lr * np.sqrt(1.0 - 0.999 ** t) / (1.0 - 0.9 ** t)
+    for p in range(params.size):
+        m[p] = 0.9 * m[p] + 0.1 * grad[p]
+        v[p] = 0.999 * v[p] + 0.001 * grad[p] * grad[p]
+        params[p] -= step * m[p] / (np.sqrt(v[p]) + 1e-8)
+
+    return loss / n
+
+def init_params(rng):
+    """Glorot-uniform weights, zero biases (float32, flat layout)."""
+    params = np.zeros(N_PARAMS, dtype=np.float32)
+    for W, (fan_in, fan_out) in zip(_unpack(params)[0::2], [(1, HIDDEN_1), (HIDDEN_1, HIDDEN_2), (HIDDEN_2, 1)]):
+        bound = np.sqrt(6.0 / (fan_in + fan_out))
+        W[:] = rng.uniform(-bound, bound, W.shape)
+    return params
+
 # State
-history_prices = []
-scaler = StandardScaler()
-# Enhanced Model: Multi-Layer Perceptron (Neural Network)
-# Hidden Layers: 100 neurons, 50 neurons. ReLU activation.
-model = MLPRegressor(hidden_layer_sizes=(100, 50), activation='relu', solver='adam', max_iter=500, warm_start=True)
-is_fitted = False
+# Keep window manageable for proof-of-concept (last 1000 points).
+# Mirrored ring buffer: each price is written at slot and slot + HISTORY_SIZE,
+# so the current window is always one contiguous slice (no copy, no wrap logic).
+# float64: at BTC prices (~1e5) float32 steps are ~0.008, too coarse for raw prices.
+HISTORY_SIZE = 1000
+history_prices = np.empty(2 * HISTORY_SIZE, dtype=np.float64)
+n_prices = 0
+# Running input scaler (Welford): updated with each new price in O(1)
+price_count = 0
+price_mean = 0.0
+price_m2 = 0.0
+rng = np.random.default_rng()
+params = init_params(rng)
+adam_m = np.zeros(N_PARAMS, dtype=np.float32)
+adam_v = np.zeros(N_PARAMS, dtype=np.float32)
+adam_t = 0
+best_score = float("-inf")
+last_save = 0.0
+price_queue = queue.Queue() # Filled by the poll_prices thread
+
+# Shared keep-alive session: Binance calls reuse one TCP/TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
 
 def fetch_price():
     try:
         url = "https://api.binance.com/api/v3/ticker/price?symbol=BTCUSDT"
-        resp = requests.get(url, timeout=5)
+        resp = _session.get(url, timeout=5)
         data = resp.json()
         return float(data['price'])
     except Exception as e:
         print(f"⚠️ Error fetching price: {e}")
         return None
 
-def train_step():
-    global is_fitted
-    
-    # 1. Fetch Data
-    price = fetch_price()
-    if price is None:
-        return
+def poll_prices():
+    """Background fetcher: queues a price every INTERVAL_SECONDS so HTTP latency overlaps training."""
+    while True:
+        price = fetch_price()
+        if price is not None:
+            price_queue.put(price)
+        time.sleep(INTERVAL_SECONDS)
 
-    print(f"📈 Fetched BTC Price: ${price:.2f}")
-    history_prices.append(price)
+def partial_fit(X, y):
+    """One shuffled pass over (X, y) in mini-batches, like MLPRegressor.partial_fit."""
+    global adam_t
+    order = rng.permutation(len(X))
+    for start in range(0, len(X), BATCH_SIZE):
+        batch = order[start:start + BATCH_SIZE]
+        adam_t += 1
+        mlp_step(params, adam_m, adam_v, adam_t, X[batch], y[batch], LEARNING_RATE)
+
+def score(X, y):
+    """Coefficient of determination R² of the current weights."""
+    residual = y - mlp_predict(params, X)
+    total = ((y - y.mean()) ** 2).sum()
+    return 1.0 - (residual ** 2).sum() / total if total > 0 else 0.0
+
+def record_price(price):
+    global n_prices
+    slot = n_prices % HISTORY_SIZE
+    history_prices[slot] = price
+    history_prices[slot + HISTORY_SIZE] = price
+    n_prices += 1
+
+def price_window():
+    """View of the last min(n_prices, HISTORY_SIZE) prices, oldest first."""
+    if n_prices < HISTORY_SIZE:
+        return history_prices[:n_prices]
+    start = n_prices % HISTORY_SIZE
+    return history_prices[start:start + HISTORY_SIZE]
+
+def update_scaler(price):
+    global price_count, price_mean, price_m2
+    price_count += 1
+    delta = price - price_mean
+    price_mean += delta / price_count
+    price_m2 += delta * (price - price_mean)
+
+def scaler_std():
+    return np.sqrt(price_m2 / price_count) + 1e-8
+
+def build_onnx():
+    """Emit scaler + MLP as Sub/Div/Gemm/Relu nodes (same I/O names as the old skl2onnx export)."""
+    W1, b1, W2, b2, W3, b3 = _unpack(params)
+    initializers = [numpy_helper.from_array(np.array(arr), name) for arr, name in
+                    [(W1, "W1"), (b1, "b1"), (W2, "W2"), (b2, "b2"), (W3, "W3"), (b3, "b3")]]
+    # The graph takes raw prices; scaling is baked in with the current running stats
+    initializers += [numpy_helper.from_array(np.array([price_mean], dtype=np.float32), "scaler_mean"),
+                     numpy_helper.from_array(np.array([scaler_std()], dtype=np.float32), "scaler_std")]
+    nodes = [
+        helper.make_node("Sub", ["float_input", "scaler_mean"], ["centered"]),
+        helper.make_node("Div", ["centered", "scaler_std"], ["scaled"]),
+        helper.make_node("Gemm", ["scaled", "W1", "b1"], ["z1"]),
+        helper.make_node("Relu", ["z1"], ["a1"]),
+        helper.make_node("Gemm", ["a1", "W2", "b2"], ["z2"]),
+        helper.make_node("Relu", ["z2"], ["a2"]),
+        helper.make_node("Gemm", ["a2", "W3", "b3"], ["variable"]),
+    ]
+    graph = helper.make_graph(
+        nodes, MODEL_NAME,
+        [helper.make_tensor_value_info("float_input", TensorProto.FLOAT, [None, 1])],
+        [helper.make_tensor_value_info("variable", TensorProto.FLOAT, [None, 1])],
+        initializer=initializers,
+    )
+    # Pin the IR version so older ONNX Runtime builds (the node's ort crate) can load it
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=7)
+
+def train_step(price):
+    global best_score, last_save
     
-    # Keep window manageable for proof-of-concept (e.g., last 1000 points)
-    if len(history_prices) > 1000:
-        history_prices.pop(0)
+    # 1. Record Data
+    print(f"📈 Fetched BTC Price: ${price:.2f}")
+    record_price(price)
+    update_scaler(price)
 
     # Need at least 2 points to train
-    if len(history_prices) < 5:
-        print(f"⏳ Collecting data... ({len(history_prices)}/5)")
+    if n_prices < 5:
+        print(f"⏳ Collecting data... ({n_prices}/5)")
         return
 
     # 2. Prepare Iterative Batch
     # Input: Price at T
     # Target: Price at T+1 (Self-Supervised / Next Token Prediction)
-    X = np.array(history_prices[:-1]).reshape(-1, 1)
-    y = np.array(history_prices[1:])
+    prices = price_window()
+    X = prices[:-1, None]
+    y = prices[1:]
 
     # 3. Train (Incremental)
     print(f"🧠 Training Enhanced Model (Epoch {int(time.time())})...")
-    X_scaled = scaler.fit_transform(X) # Note: Scaling changes every step, imperfect for online but okay for demo
+    X_scaled = ((X - price_mean) / scaler_std()).astype(np.float32)
     
-    try:
-        model.partial_fit(X_scaled, y)
-        is_fitted = True
-        score = model.score(X_scaled, y)
-        print(f"✅ Training Complete. R² Score: {score:.4f}")
-    except Exception as e:
-        # First fit needs full fit? partial_fit handles it if classes usually provided, but regressor is easier
-        model.fit(X_scaled, y)
-        is_fitted = True
-        print(f"✅ Initial Training Complete.")
+    partial_fit(X_scaled, y)
+    r2 = score(X_scaled, y)
+    print(f"✅ Training Complete. R² Score: {r2:.4f}")
 
     # 4. Export to ONNX
-    # We export ONLY if fitted
-    if is_fitted:
+    # Only when the fit improved, or SAVE_INTERVAL_SECONDS after the last save
+    now = time.time()
+    if r2 > best_score + 1e-4 or now - last_save >= SAVE_INTERVAL_SECONDS:
         try:
-            initial_type = [('float_input', FloatTensorType([None, 1]))]
-            onnx_model = convert_sklearn(model, initial_types=initial_type)
+            onnx_model = build_onnx()
             with open(ONNX_PATH, "wb") as f:
                 f.write(onnx_model.SerializeToString())
+            best_score = max(best_score, r2)
+            last_save = now
             print(f"💾 Saved Enhanced Model to {ONNX_PATH}")
         except Exception as e:
             print(f"❌ Failed to export ONNX: {e}")
@@ -99,16 +295,20 @@ def main():
     start_time = time.time()
     end_time = start_time + (DURATION_HOURS * 3600)
 
+    threading.Thread(target=poll_prices, daemon=True).start()
+
     while time.time() < end_time:
-        train_step()
+        try:
+            price = price_queue.get(timeout=max(0.0, end_time - time.time()))
+        except queue.Empty:
+            break
+        train_step(price)
         
         # Calculate progress
         elapsed = time.time() - start_time
         remaining = end_time - time.time()
         print(f"⏱️ Elapsed: {elapsed/3600:.2f}h | Remaining: {remaining/3600:.2f}h")
         print("--------------------------------------------------")
-        
-        time.sleep(INTERVAL_SECONDS)
 
 if __name__ == "__main__":
     main()
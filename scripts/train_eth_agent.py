@@ -52,13 +52,9 @@ class StandardScaler:
         return (data - self.mean) / self.std
 
 def create_sequences(data, seq_length):
-    xs, ys = [], []
-    for i in range(len(data) - seq_length):
-        x = data[i:i+seq_length]
-        y = data[i+seq_length][0] 
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    # Sliding windows over time: X[i] = data[i:i+seq_length], y[i] = next Close
+    windows = np.lib.stride_tricks.sliding_window_view(data, (seq_length, data.shape[1]))[:-1, 0]
+    return np.ascontiguousarray(windows), data[seq_length:, 0]
 
 # === 3. Model Definition ===
 class CryptoLSTM(nn.Module):
@@ -160,6 +156,8 @@ def main():
             do_constant_folding=True,
             input_names=['input'],
             output_names=['output'],
+            # Dynamic batch: the backtest scores every window in one run
+            dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
             verbose=False  # Disable verbose output
         )
         shutil.copy(MODEL_PATH, DIST_PATH)
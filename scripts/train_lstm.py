@@ -1,11 +1,14 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import TensorDataset, DataLoader
 import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
+from compile_utils import maybe_compile
 
 # === Configuration ===
 SYMBOL = "BTCUSDT"
@@ -14,8 +17,13 @@ LIMIT = 1000     # Last 1000 hours (~41 days)
 SEQ_LENGTH = 30  # Look back 30 hours
 HIDDEN_SIZE = 64
 EPOCHS = 50
+BATCH_SIZE = 64
 MODEL_PATH = "models/price_decision_v2.onnx"
 
+# Shared keep-alive session: Binance calls reuse one TCP/TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 # === 1. Data Fetching ===
 def fetch_binance_data():
     url = "https://api.binance.com/api/v3/klines"
@@ -23,7 +31,7 @@ def fetch_binance_data():
     print(f"Fetching {LIMIT} candles ({INTERVAL}) for {SYMBOL}...")
     
     try:
-        resp = requests.get(url, params=params)
+        resp = _session.get(url, params=params)
         resp.raise_for_status()
         data = resp.json()
         # [Open Time, Open, High, Low, Close, Volume, ...]
@@ -51,13 +59,12 @@ class StandardScaler:
         return (data * self.std) + self.mean
 
 def create_sequences(data, seq_length):
-    xs, ys = [], []
-    for i in range(len(data) - seq_length):
-        x = data[i:i+seq_length]
-        y = data[i+seq_length][0] # Predict next Close Price (index 0)
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    # Sliding windows over time: X[i] = data[i:i+seq_length], y[i] = next Close
+    # Returned as contiguous float32 so torch.from_numpy can wrap them without a copy
+    windows = np.lib.stride_tricks.sliding_window_view(data, (seq_length, data.shape[1]))[:-1, 0]
+    X = np.ascontiguousarray(windows, dtype=np.float32)
+    y = np.ascontiguousarray(data[seq_length:, 0:1], dtype=np.float32)
+    return X, y
 
 # === 3. Model Definition ===
 class CryptoLSTM(nn.Module):
@@ -84,26 +91,36 @@ def main():
     X, y = create_sequences(scaled_data, SEQ_LENGTH)
     
     # Convert to Tensors
-    X_tensor = torch.FloatTensor(X)
-    y_tensor = torch.FloatTensor(y).view(-1, 1)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    X_tensor = torch.from_numpy(X).to(device, non_blocking=True)
+    y_tensor = torch.from_numpy(y).to(device, non_blocking=True)
     
     # B. Train
     print("Training LSTM Brain...")
-    model = CryptoLSTM(hidden_size=HIDDEN_SIZE)
+    model = CryptoLSTM(hidden_size=HIDDEN_SIZE).to(device)
+    # The compiled wrapper shares parameters with `model`; ONNX export uses the eager module
+    compiled_model = maybe_compile(model, device)
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(), lr=0.001)
     
+    dataset = TensorDataset(X_tensor, y_tensor)
+    # Full batches only: a short last batch would capture a second compiled graph
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True, drop_last=True)
+
     for epoch in range(EPOCHS):
         model.train()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        
+        epoch_loss = 0.0
+        for xb, yb in loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(compiled_model(xb), yb)
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item()
+        epoch_loss /= len(loader)
+
         if (epoch+1) % 10 == 0:
-            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {loss.item():.6f}", flush=True)
+            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {epoch_loss:.6f}", flush=True)
 
     print("Training Complete.", flush=True)
 
@@ -115,12 +132,16 @@ def main():
     os.makedirs("dist/models", exist_ok=True) # Ensure dist exists too
 
     # Export
+    model.cpu().eval()
     try:
         dummy_input = torch.randn(1, SEQ_LENGTH, 2)
         # Simplify export: No dynamic axes for now, use opset 17
         torch.onnx.export(model, 
                           dummy_input, 
                           MODEL_PATH, 
+                          export_params=True,
+                          do_constant_folding=True,
+                          training=torch.onnx.TrainingMode.EVAL,
                           input_names=['input'], 
                           output_names=['output'],
                           opset_version=17) 
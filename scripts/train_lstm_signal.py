@@ -9,13 +9,20 @@ traditional ML models miss.
 
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
 from sklearn.preprocessing import StandardScaler
 import joblib
+from compile_utils import maybe_compile
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: fall back to the stdlib JSON decoder
+    orjson = None
 
 # Configuration
 MODEL_DIR = "models"
@@ -29,6 +36,18 @@ LEARNING_RATE = 0.001
 
 os.makedirs(MODEL_DIR, exist_ok=True)
 
+# Sequence shapes never change between steps: autotune cuDNN kernels once
+# per shape and let fp32 matmuls use TF32 tensor cores where available
+torch.backends.cudnn.benchmark = True
+torch.set_float32_matmul_precision('high')
+
+# Shared keep-alive session: the per-ticker fetches reuse one TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
+# Trace input shared by every ticker's ONNX export (exports run on CPU)
+EXPORT_DUMMY_INPUT = torch.randn(1, SEQUENCE_LENGTH, 11)
+
 class SignalLSTM(nn.Module):
     """
     LSTM Architecture for Trading Signal Classification
@@ -60,18 +79,6 @@ class SignalLSTM(nn.Module):
         output = self.fc(last_output)
         return output  # Raw logits (use with CrossEntropyLoss)
 
-class PriceDataset(Dataset):
-    """PyTorch Dataset for sequential price data"""
-    def __init__(self, sequences, labels):
-        self.sequences = torch.FloatTensor(sequences)
-        self.labels = torch.LongTensor(labels)
-        
-    def __len__(self):
-        return len(self.labels)
-    
-    def __getitem__(self, idx):
-        return self.sequences[idx], self.labels[idx]
-
 def fetch_binance_data(ticker, limit=5000):
     """Fetch OHLCV data from Binance"""
     url = "https://api.binance.com/api/v3/klines"
@@ -81,21 +88,47 @@ def fetch_binance_data(ticker, limit=5000):
         "limit": str(limit)
     }
     
-    response = requests.get(url, params=params)
-    data = response.json()
+    response = _session.get(url, params=params, timeout=10)
+    data = orjson.loads(response.content) if orjson else response.json()
     
-    highs = []
-    lows = []
-    closes = []
-    volumes = []
-    
-    for candle in data:
-        highs.append(float(candle[2]))
-        lows.append(float(candle[3]))
-        closes.append(float(candle[4]))
-        volumes.append(float(candle[5]))
-    
-    return np.array(highs), np.array(lows), np.array(closes), np.array(volumes)
+    # Columns 2-5 are High, Low, Close, Volume (as strings): one cast, then
+    # one contiguous row per series
+    columns = np.asarray(data, dtype=object)[:, 2:6].astype(np.float64)
+    highs, lows, closes, volumes = np.ascontiguousarray(columns.T)
+    return highs, lows, closes, volumes
+
+def calculate_ema(prices, period):
+    """EMA seeded with the SMA of the first `period` prices (as in signal_model.rs)"""
+    k = 2.0 / (period + 1)
+    ema = np.zeros(len(prices))
+    if len(prices) > period:
+        # Recurrence runs on Python floats (tolist) rather than numpy scalars
+        prev = prices[:period].mean()
+        out = [prev]
+        for p in prices[period:].tolist():
+            prev = (p - prev) * k + prev
+            out.append(prev)
+        ema[period - 1:] = out
+    return ema
+
+def calculate_rsi(prices, period=14):
+    """Wilder RSI seeded with the mean gain/loss of the first `period` changes"""
+    rsi = np.full(len(prices), 50.0)
+    if len(prices) <= period:
+        return rsi
+    
+    changes = np.diff(prices)
+    gains = np.maximum(changes, 0)
+    losses = np.maximum(-changes, 0)
+    avg_gain = float(gains[:period].mean())
+    avg_loss = float(losses[:period].mean())
+    out = []
+    for gain, loss in zip(gains[period:].tolist(), losses[period:].tolist()):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        out.append(100.0 if avg_loss == 0 else 100.0 - (100.0 / (1.0 + avg_gain / avg_loss)))
+    rsi[period + 1:] = out
+    return rsi
 
 def calculate_technical_indicators(highs, lows, closes, volumes):
     """
@@ -107,68 +140,68 @@ def calculate_technical_indicators(highs, lows, closes, volumes):
     """
     n = len(closes)
     features = np.zeros((n, 11))
+    if n <= 200:  # Need 200 for SMA200
+        return features
     
     # Simplified feature calculation for demo
     # In production, use TA-Lib or implement full indicators
-    
-    for i in range(200, n):  # Need 200 for SMA200
-        # Feature 0: RSI (simplified)
-        if i >= 14:
-            gains = sum([max(closes[j] - closes[j-1], 0) for j in range(i-14, i)]) / 14
-            losses = sum([max(closes[j-1] - closes[j], 0) for j in range(i-14, i)]) / 14
-            if losses == 0:
-                features[i, 0] = 100
-            else:
-                rs = gains / losses
-                features[i, 0] = 100 - (100 / (1 + rs))
+    #
+    # Every feature is computed for all bars i in [200, n) at once. Trailing
+    # windows exclude bar i itself (e.g. closes[i-20:i]) and are strided views;
+    # recurrences (RSI, EMA) are likewise read at bar i-1.
+    def trailing(x, window):
+        """(n-200, window) view whose row for bar i is x[i-window:i]"""
+        return sliding_window_view(x, window)[200 - window:n - window]
+    
+    c = closes[200:]
+    prev_closes = np.concatenate(([closes[0]], closes[:-1]))
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Feature 0: RSI (Wilder)
+        features[200:, 0] = calculate_rsi(closes, 14)[199:n - 1]
         
-        # Feature 1: MACD (simplified)
-        if i >= 26:
-            ema12 = np.mean(closes[i-12:i])
-            ema26 = np.mean(closes[i-26:i])
-            features[i, 1] = ema12 - ema26
+        # Feature 1: MACD
+        macd = calculate_ema(closes, 12) - calculate_ema(closes, 26)
+        features[200:, 1] = macd[199:n - 1]
         
         # Feature 2-3: Bollinger Bands
-        if i >= 20:
-            sma = np.mean(closes[i-20:i])
-            std = np.std(closes[i-20:i])
-            upper = sma + 2 * std
-            lower = sma - 2 * std
-            features[i, 2] = (upper - lower) / sma if sma != 0 else 0  # BB Width
-            features[i, 3] = (closes[i] - lower) / (upper - lower) if (upper - lower) != 0 else 0.5  # BB Position
+        window20 = trailing(closes, 20)
+        sma = window20.mean(axis=-1)
+        std = window20.std(axis=-1)
+        upper = sma + 2 * std
+        lower = sma - 2 * std
+        band = upper - lower
+        features[200:, 2] = np.where(sma != 0, band / sma, 0)  # BB Width
+        features[200:, 3] = np.where(band != 0, (c - lower) / band, 0.5)  # BB Position
         
         # Feature 4-5: SMA Divergence
-        sma20 = np.mean(closes[i-20:i])
-        sma50 = np.mean(closes[i-50:i])
-        sma200 = np.mean(closes[i-200:i])
-        features[i, 4] = (sma20 - sma50) / sma50 if sma50 != 0 else 0
-        features[i, 5] = (sma50 - sma200) / sma200 if sma200 != 0 else 0
+        sma20 = sma
+        sma50 = trailing(closes, 50).mean(axis=-1)
+        sma200 = trailing(closes, 200).mean(axis=-1)
+        features[200:, 4] = np.where(sma50 != 0, (sma20 - sma50) / sma50, 0)
+        features[200:, 5] = np.where(sma200 != 0, (sma50 - sma200) / sma200, 0)
         
         # Feature 6: Price Momentum
-        if i >= 5:
-            features[i, 6] = (closes[i] - closes[i-5]) / closes[i-5] if closes[i-5] != 0 else 0
+        c5 = closes[195:n - 5]
+        features[200:, 6] = np.where(c5 != 0, (c - c5) / c5, 0)
         
         # Feature 7: Volume Ratio
-        if i >= 20:
-            vol_avg = np.mean(volumes[i-20:i])
-            features[i, 7] = volumes[i] / vol_avg if vol_avg != 0 else 1.0
+        vol_avg = trailing(volumes, 20).mean(axis=-1)
+        features[200:, 7] = np.where(vol_avg != 0, volumes[200:] / vol_avg, 1.0)
         
-        # Feature 8: ATR (simplified)
-        if i >= 14:
-            tr = max(highs[i] - lows[i], abs(highs[i] - closes[i-1]), abs(lows[i] - closes[i-1]))
-            atr = np.mean([max(highs[j] - lows[j], abs(highs[j] - closes[j-1]), abs(lows[j] - closes[j-1])) 
-                          for j in range(i-14, i)])
-            features[i, 8] = atr / closes[i] if closes[i] != 0 else 0
+        # Feature 8: ATR (simplified), mean true range over bars [i-14, i)
+        tr = np.maximum.reduce([highs - lows, np.abs(highs - prev_closes), np.abs(lows - prev_closes)])
+        atr = trailing(tr, 14).mean(axis=-1)
+        features[200:, 8] = np.where(c != 0, atr / c, 0)
         
         # Feature 9: Stochastic Oscillator
-        if i >= 14:
-            lowest = np.min(lows[i-14:i])
-            highest = np.max(highs[i-14:i])
-            features[i, 9] = ((closes[i] - lowest) / (highest - lowest)) * 100 if (highest - lowest) != 0 else 50
-        
-        # Feature 10: OBV Momentum (simplified)
-        # OBV calculation would be cumulative, simplified here
-        features[i, 10] = 0.0  # Placeholder
+        lowest = trailing(lows, 14).min(axis=-1)
+        highest = trailing(highs, 14).max(axis=-1)
+        features[200:, 9] = np.where(highest - lowest != 0, ((c - lowest) / (highest - lowest)) * 100, 50)
+    
+    # Feature 10: OBV Momentum (simplified)
+    # OBV calculation would be cumulative, simplified here
+    features[200:, 10] = 0.0  # Placeholder
     
     return features
 
@@ -186,31 +219,23 @@ def create_sequences(features, closes, seq_length=SEQUENCE_LENGTH, look_ahead=6)
         sequences: (n_sequences, seq_length, n_features)
         labels: (n_sequences,) - 0=SELL, 1=HOLD, 2=BUY
     """
-    sequences = []
-    labels = []
-    
     start_idx = 200  # Need 200 for indicators
-    for i in range(start_idx + seq_length, len(closes) - look_ahead):
-        # Get sequence of features
-        seq = features[i-seq_length:i]
-        
-        # Calculate future return
-        current_price = closes[i]
-        future_price = closes[i + look_ahead]
-        future_return = (future_price - current_price) / current_price * 100.0
-        
-        # Label based on threshold (0.15% as in Rust code)
-        if future_return > 0.15:
-            label = 2  # BUY
-        elif future_return < -0.15:
-            label = 0  # SELL
-        else:
-            label = 1  # HOLD
-        
-        sequences.append(seq)
-        labels.append(label)
+    end_idx = len(closes) - look_ahead  # Exclusive bound on the labelled bar i
+    
+    # Sequence for bar i is features[i-seq_length:i]: window rows start at
+    # i - seq_length, for i in [start_idx + seq_length, end_idx)
+    windows = sliding_window_view(features, (seq_length, features.shape[1]))[:, 0]
+    sequences = np.ascontiguousarray(windows[start_idx:max(end_idx - seq_length, start_idx)])
+    
+    # Calculate future return
+    current_price = closes[start_idx + seq_length:end_idx]
+    future_price = closes[start_idx + seq_length + look_ahead:]
+    future_return = (future_price - current_price) / current_price * 100.0
     
-    return np.array(sequences), np.array(labels)
+    # Label based on threshold (0.15% as in Rust code): 0=SELL, 1=HOLD, 2=BUY
+    labels = np.where(future_return > 0.15, 2, np.where(future_return < -0.15, 0, 1))
+    
+    return sequences, labels
 
 def train_lstm_model(ticker):
     """Train LSTM model for a specific ticker"""
@@ -241,15 +266,19 @@ def train_lstm_model(ticker):
     
     # 4. Normalize Features
     print("📏 Normalizing features...")
-    scaler = StandardScaler()
+    # copy=False: the flat reshape is a view and is scaled in place, so the
+    # (N*L, F) buffer is never duplicated
+    scaler = StandardScaler(copy=False)
     n_samples, seq_len, n_features = sequences.shape
     sequences_flat = sequences.reshape(-1, n_features)
-    sequences_scaled = scaler.fit_transform(sequences_flat)
-    sequences_scaled = sequences_scaled.reshape(n_samples, seq_len, n_features)
+    scaler.fit(sequences_flat)
+    scaler.transform(sequences_flat)
+    sequences_scaled = sequences
     
-    # Save scaler
+    # Save scaler (copying again, so inference-time transform() leaves callers' arrays intact)
     ticker_short = ticker.replace("USDT", "").lower()
     scaler_path = os.path.join(MODEL_DIR, f"{ticker_short}_lstm_scaler.pkl")
+    scaler.set_params(copy=True)
     joblib.dump(scaler, scaler_path)
     print(f"💾 Saved scaler: {scaler_path}")
     
@@ -262,18 +291,23 @@ def train_lstm_model(ticker):
     
     print(f"🔀 Split: {len(X_train)} train, {len(X_val)} validation")
     
-    # 6. Create DataLoaders
-    train_dataset = PriceDataset(X_train, y_train)
-    val_dataset = PriceDataset(X_val, y_val)
-    
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
-    
-    # 7. Initialize Model
+    # 6. Move Data to Device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"🖥️  Using device: {device}")
     
+    # The whole dataset is a few MB, so it is copied to the device once and
+    # batches are gathered there by index (no DataLoader or per-batch copies)
+    X_train_t = torch.from_numpy(X_train).float().to(device)
+    y_train_t = torch.from_numpy(y_train).long().to(device)
+    X_val_t = torch.from_numpy(X_val).float().to(device)
+    y_val_t = torch.from_numpy(y_val).long().to(device)
+    # Full training batches only: a short last batch would capture a second compiled graph
+    n_train_batches = len(X_train_t) // BATCH_SIZE
+    
+    # 7. Initialize Model
     model = SignalLSTM(input_size=11, hidden_size=HIDDEN_SIZE, num_layers=NUM_LAYERS).to(device)
+    # The compiled wrapper shares parameters with `model`; ONNX export and checkpoints use the eager module
+    compiled_model = maybe_compile(model, device)
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=LEARNING_RATE)
     
@@ -288,12 +322,14 @@ def train_lstm_model(ticker):
         train_correct = 0
         train_total = 0
         
-        for sequences_batch, labels_batch in train_loader:
-            sequences_batch = sequences_batch.to(device)
-            labels_batch = labels_batch.to(device)
+        idx = torch.randperm(len(X_train_t), device=device)
+        for start in range(0, n_train_batches * BATCH_SIZE, BATCH_SIZE):
+            batch_idx = idx[start:start + BATCH_SIZE]
+            sequences_batch = X_train_t[batch_idx]
+            labels_batch = y_train_t[batch_idx]
             
             optimizer.zero_grad()
-            outputs = model(sequences_batch)
+            outputs = compiled_model(sequences_batch)
             loss = criterion(outputs, labels_batch)
             loss.backward()
             optimizer.step()
@@ -312,11 +348,11 @@ def train_lstm_model(ticker):
         val_total = 0
         
         with torch.no_grad():
-            for sequences_batch, labels_batch in val_loader:
-                sequences_batch = sequences_batch.to(device)
-                labels_batch = labels_batch.to(device)
+            for start in range(0, len(X_val_t), BATCH_SIZE):
+                sequences_batch = X_val_t[start:start + BATCH_SIZE]
+                labels_batch = y_val_t[start:start + BATCH_SIZE]
                 
-                outputs = model(sequences_batch)
+                outputs = compiled_model(sequences_batch)
                 loss = criterion(outputs, labels_batch)
                 
                 val_loss += loss.item()
@@ -328,7 +364,7 @@ def train_lstm_model(ticker):
         
         # Print progress every 5 epochs
         if (epoch + 1) % 5 == 0:
-            print(f"Epoch [{epoch+1}/{EPOCHS}] | Train Loss: {train_loss/len(train_loader):.4f} | Train Acc: {train_acc:.2f}% | Val Acc: {val_acc:.2f}%")
+            print(f"Epoch [{epoch+1}/{EPOCHS}] | Train Loss: {train_loss/n_train_batches:.4f} | Train Acc: {train_acc:.2f}% | Val Acc: {val_acc:.2f}%")
         
         # Save best model
         if val_acc > best_val_acc:
@@ -342,17 +378,17 @@ def train_lstm_model(ticker):
     
     # 9. Export to ONNX
     print(f"\n📦 Exporting to ONNX...")
-    model.eval()
-    dummy_input = torch.randn(1, SEQUENCE_LENGTH, 11).to(device)
+    model.cpu().eval()
     onnx_path = os.path.join(MODEL_DIR, f"{ticker_short}_lstm.onnx")
     
     torch.onnx.export(
         model,
-        dummy_input,
+        EXPORT_DUMMY_INPUT,
         onnx_path,
         export_params=True,
-        opset_version=11,
+        opset_version=17,
         do_constant_folding=True,
+        training=torch.onnx.TrainingMode.EVAL,
         input_names=['input'],
         output_names=['output'],
         dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}
@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import TensorDataset, DataLoader
 import numpy as np
 import pandas as pd
 import requests
@@ -8,6 +9,7 @@ import json
 import os
 import time
 import sys
+from compile_utils import maybe_compile
 
 # Fix Unicode encoding issue for Windows
 if sys.platform == 'win32':
@@ -20,12 +22,18 @@ INTERVAL = "1h"  # 1 Hour candles
 LIMIT = 2000     # Last 2000 hours (~83 days) for better training
 SEQ_LENGTH = 30  # Look back 30 hours (Must match OracleScheduler)
 HIDDEN_SIZE = 64
-EPOCHS = 2000   # Production quality training
+EPOCHS = 200    # Production quality training (mini-batches: ~30 steps/epoch)
+BATCH_SIZE = 64
 # User asked for "after 1 hour training". We will simulate "intense training".
 MODEL_PATH = "models/ltc_v1.onnx"
 DIST_PATH = "dist/models/ltc_v1.onnx"
 RPC_URL = "http://localhost:9000"
 
+# Batch shapes are fixed, so let cuDNN autotune its LSTM kernels once, and
+# allow TF32 tensor cores for the fp32 matmuls (Ampere+)
+torch.backends.cudnn.benchmark = True
+torch.set_float32_matmul_precision('high')
+
 # === 1. Data Fetching ===
 def fetch_binance_data():
     url = "https://api.binance.com/api/v3/klines"
@@ -49,16 +57,15 @@ class StandardScaler:
     def fit_transform(self, data):
         self.mean = data.mean(axis=0)
         self.std = data.std(axis=0) + 1e-8
-        return (data - self.mean) / self.std
+        # Scale in place: no temporaries the size of the data
+        data -= self.mean
+        data /= self.std
+        return data
 
 def create_sequences(data, seq_length):
-    xs, ys = [], []
-    for i in range(len(data) - seq_length):
-        x = data[i:i+seq_length]
-        y = data[i+seq_length][0] 
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    # Sliding windows over time: X[i] = data[i:i+seq_length], y[i] = next Close
+    windows = np.lib.stride_tricks.sliding_window_view(data, (seq_length, data.shape[1]))[:-1, 0]
+    return np.ascontiguousarray(windows), data[seq_length:, 0]
 
 # === 3. Model Definition ===
 class CryptoLSTM(nn.Module):
@@ -106,24 +113,46 @@ def main():
     y_tensor = torch.FloatTensor(y).view(-1, 1)
     
     # B. Train
-    model = CryptoLSTM(hidden_size=HIDDEN_SIZE)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    model = CryptoLSTM(hidden_size=HIDDEN_SIZE).to(device)
+    # The compiled wrapper shares parameters with `model`; ONNX export uses the eager module
+    compiled_model = maybe_compile(model, device)
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(), lr=0.001)
     
+    # Mixed precision on GPU only: fp16 autocast runs cuDNN's fused LSTM on
+    # tensor cores, GradScaler keeps small fp16 gradients from underflowing
+    use_amp = device.type == 'cuda'
+    grad_scaler = torch.amp.GradScaler('cuda', enabled=use_amp)
+    
+    dataset = TensorDataset(X_tensor, y_tensor)
+    # In-memory tensors: batches are plain index slices, worker processes would
+    # only add spawn/IPC overhead (and respawn every epoch). Full batches only:
+    # a short last batch would capture a second compiled graph
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True, drop_last=True,
+                        pin_memory=torch.cuda.is_available(), num_workers=0)
+    
     start_time = time.time()
     
     for epoch in range(EPOCHS):
         model.train()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
+        epoch_loss = 0.0
+        for xb, yb in loader:
+            xb = xb.to(device, non_blocking=True)
+            yb = yb.to(device, non_blocking=True)
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(device_type=device.type, dtype=torch.float16, enabled=use_amp):
+                loss = criterion(compiled_model(xb), yb)
+            grad_scaler.scale(loss).backward()
+            grad_scaler.step(optimizer)
+            grad_scaler.update()
+            epoch_loss += loss.item()
+        epoch_loss /= len(loader)
         
-        if (epoch+1) % 100 == 0:
+        if (epoch+1) % 20 == 0:
             elapsed = time.time() - start_time
-            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {loss.item():.6f}, Time: {elapsed:.1f}s", flush=True)
+            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {epoch_loss:.6f}, Time: {elapsed:.1f}s", flush=True)
 
     print("Training Complete.", flush=True)
 
@@ -144,7 +173,7 @@ def main():
 
     # D. Export ONNX
     dummy_input = torch.randn(1, SEQ_LENGTH, 2)
-    model.eval()  # Set to eval mode for export
+    model.cpu().eval()  # Set to eval mode for export
     
     # Suppress verbose ONNX export output to avoid Unicode errors
     import logging
@@ -156,10 +185,13 @@ def main():
             dummy_input, 
             MODEL_PATH,
             export_params=True,
-            opset_version=12,
+            opset_version=17,
             do_constant_folding=True,
+            training=torch.onnx.TrainingMode.EVAL,
             input_names=['input'],
             output_names=['output'],
+            # Dynamic batch: the backtest scores every window in one run
+            dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
             verbose=False  # Disable verbose output
         )
         shutil.copy(MODEL_PATH, DIST_PATH)
@@ -10,10 +10,48 @@ Each model predicts price movement for its specific timeframe.
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-import joblib
+from sklearn.ensemble import HistGradientBoostingClassifier
+from joblib import Parallel, delayed
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+from skl2onnx.operator_converters import random_forest as _skl2onnx_forest
 import os
+from datetime import datetime, timezone
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: fall back to the stdlib JSON decoder
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional: fall back to plain Python loops
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
+
+def _patch_hgb_converter():
+    """Make skl2onnx's HistGradientBoosting converter emit int missing-value flags
+    
+    It appends a Python bool as the flag of every leaf, which protobuf >= 6
+    rejects in an ints attribute, so every conversion failed. Applied inside
+    each worker process (loky workers never run this module's top level).
+    """
+    add_tree = _skl2onnx_forest.add_tree_to_attribute_pairs_hist_gradient_boosting
+    if getattr(add_tree, "int_flags", False):
+        return
+    
+    def add_tree_int_flags(attr_pairs, *args, **kwargs):
+        flags = attr_pairs["nodes_missing_value_tracks_true"]
+        start = len(flags)
+        add_tree(attr_pairs, *args, **kwargs)
+        flags[start:] = [int(flag) for flag in flags[start:]]
+    
+    add_tree_int_flags.int_flags = True
+    _skl2onnx_forest.add_tree_to_attribute_pairs_hist_gradient_boosting = add_tree_int_flags
 
 TIMEFRAMES = {
     '5m': 1,      # 1 candle ahead
@@ -26,8 +64,23 @@ TIMEFRAMES = {
 
 ASSETS = ['BTC', 'ETH', 'SOL', 'LTC']
 
+CACHE_DIR = 'cache'
+
+# Keep-alive session: fetches made by the same process reuse one TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 def fetch_binance_data(symbol, limit=1000):
-    """Fetch OHLCV data from Binance"""
+    """Fetch OHLCV data from Binance
+    
+    Cached on disk for the current UTC day, so same-day re-runs skip the
+    download (each asset is fetched once per run by prepare_asset).
+    """
+    day = datetime.now(timezone.utc).strftime('%Y%m%d')
+    cache_path = os.path.join(CACHE_DIR, f"{symbol}USDT_5m_{limit}_{day}.npy")
+    if os.path.exists(cache_path):
+        return np.load(cache_path)
+    
     url = f"https://api.binance.com/api/v3/klines"
     params = {
         'symbol': f'{symbol}USDT',
@@ -35,81 +88,181 @@ def fetch_binance_data(symbol, limit=1000):
         'limit': limit
     }
     
-    response = requests.get(url, params=params)
-    data = response.json()
-    
-    ohlcv = []
-    for candle in data:
-        ohlcv.append([
-            float(candle[1]),  # Open
-            float(candle[2]),  # High
-            float(candle[3]),  # Low
-            float(candle[4]),  # Close
-            float(candle[5]),  # Volume
-        ])
+    response = _session.get(url, params=params, timeout=10)
+    data = orjson.loads(response.content) if orjson else response.json()
     
-    return np.array(ohlcv)
+    # Columns 1-5 are Open, High, Low, Close, Volume (as strings): one cast
+    ohlcv = np.asarray(data, dtype=object)[:, 1:6].astype(np.float64)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    np.save(cache_path, ohlcv)
+    return ohlcv
 
-def calculate_features(ohlcv):
-    """Calculate 11 technical indicators"""
-    closes = ohlcv[:, 3]
-    highs = ohlcv[:, 1]
-    lows = ohlcv[:, 2]
-    volumes = ohlcv[:, 4]
-    
-    features = []
-    
-    for i in range(200, len(closes)):
-        # RSI
-        gains = np.maximum(np.diff(closes[i-14:i+1]), 0)
-        losses = np.maximum(-np.diff(closes[i-14:i+1]), 0)
-        avg_gain = np.mean(gains) if len(gains) > 0 else 0
-        avg_loss = np.mean(losses) if len(losses) > 0 else 0
-        rs = avg_gain / avg_loss if avg_loss != 0 else 0
-        rsi = 100 - (100 / (1 + rs))
+@njit(cache=True)
+def _window_sum(x, lo, hi, ref):
+    """Sum of x[lo:hi] - ref (used once to seed a running sum)"""
+    s = 0.0
+    for k in range(lo, hi):
+        s += x[k] - ref
+    return s
+
+@njit(cache=True, fastmath=True)
+def _compute_features_njit(highs, lows, closes, volumes):
+    """Per-bar indicator loop; row r holds the 11 features of bar 200 + r
+    
+    Every trailing window (ending at bar i, inclusive) is kept as a running
+    sum updated by one add and one subtract per bar, and the 14-bar stochastic
+    high/low by monotonic index queues, so the whole pass is O(n).
+    """
+    n = len(closes)
+    out = np.zeros((max(n - 200, 0), 11))
+    if n <= 200:
+        return out
+    
+    # Close sums are taken relative to a reference price so the variance
+    # (sum_sq/W - mean^2) doesn't cancel catastrophically at ~1e5 prices
+    ref = closes[199]
+    sum20 = _window_sum(closes, 180, 200, ref)
+    sum50 = _window_sum(closes, 150, 200, ref)
+    sum200 = _window_sum(closes, 0, 200, ref)
+    sum_sq20 = 0.0
+    for k in range(180, 200):
+        sum_sq20 += (closes[k] - ref) ** 2
+    vol_sum20 = _window_sum(volumes, 180, 200, 0.0)
+    # Exact count of non-zero volumes: a running sum can leave ~1e-14 residue
+    # where the true 20-bar average is 0
+    vol_nonzero20 = 0
+    for k in range(180, 200):
+        if volumes[k] != 0:
+            vol_nonzero20 += 1
+    
+    # MACD EMAs and Wilder RSI are seeded from simple means over the first
+    # bars and carried forward by their recurrences, as in signal_model.rs
+    k12 = 2.0 / 13.0
+    k26 = 2.0 / 27.0
+    ema12 = _window_sum(closes, 0, 12, 0.0) / 12
+    for k in range(12, 200):
+        ema12 += (closes[k] - ema12) * k12
+    ema26 = _window_sum(closes, 0, 26, 0.0) / 26
+    for k in range(26, 200):
+        ema26 += (closes[k] - ema26) * k26
+    
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for k in range(1, 15):
+        d = closes[k] - closes[k - 1]
+        if d > 0:
+            avg_gain += d
+        else:
+            avg_loss -= d
+    avg_gain /= 14
+    avg_loss /= 14
+    for k in range(15, 200):
+        d = closes[k] - closes[k - 1]
+        avg_gain = (avg_gain * 13 + max(d, 0.0)) / 14
+        avg_loss = (avg_loss * 13 + max(-d, 0.0)) / 14
+    
+    # Monotonic queues of bar indices: highs decreasing, lows increasing
+    max_q = np.empty(n, dtype=np.int64)
+    min_q = np.empty(n, dtype=np.int64)
+    max_head = max_tail = 0
+    min_head = min_tail = 0
+    for k in range(187, 200):
+        while max_tail > max_head and highs[max_q[max_tail - 1]] <= highs[k]:
+            max_tail -= 1
+        max_q[max_tail] = k
+        max_tail += 1
+        while min_tail > min_head and lows[min_q[min_tail - 1]] >= lows[k]:
+            min_tail -= 1
+        min_q[min_tail] = k
+        min_tail += 1
+    
+    for i in range(200, n):
+        c = closes[i] - ref
+        sum20 += c - (closes[i - 20] - ref)
+        sum50 += c - (closes[i - 50] - ref)
+        sum200 += c - (closes[i - 200] - ref)
+        sum_sq20 += c * c - (closes[i - 20] - ref) ** 2
+        vol_sum20 += volumes[i] - volumes[i - 20]
+        vol_nonzero20 += int(volumes[i] != 0) - int(volumes[i - 20] != 0)
+        
+        # RSI (Wilder smoothing)
+        d = closes[i] - closes[i - 1]
+        avg_gain = (avg_gain * 13 + max(d, 0.0)) / 14
+        avg_loss = (avg_loss * 13 + max(-d, 0.0)) / 14
+        rsi = 100 - (100 / (1 + avg_gain / avg_loss)) if avg_loss != 0 else 100.0
         
         # MACD  
-        ema12 = np.mean(closes[i-11:i+1])
-        ema26 = np.mean(closes[i-25:i+1])
-        macd = (ema12 - ema26) / closes[i] if closes[i] != 0 else 0
+        ema12 += (closes[i] - ema12) * k12
+        ema26 += (closes[i] - ema26) * k26
+        macd = ema12 - ema26
         
         # Bollinger Bands
-        sma_20 = np.mean(closes[i-19:i+1])
-        std_20 = np.std(closes[i-19:i+1])
+        mean_dev20 = sum20 / 20
+        sma_20 = ref + mean_dev20
+        std_20 = np.sqrt(max(sum_sq20 / 20 - mean_dev20 * mean_dev20, 0.0))
         bb_upper = sma_20 + (2 * std_20)
         bb_lower = sma_20 - (2 * std_20)
-        bb_width = (bb_upper - bb_lower) / closes[i] if closes[i] != 0 else 0
+        bb_width = (bb_upper - bb_lower) / closes[i] if closes[i] != 0 else 0.0
         bb_position = (closes[i] - bb_lower) / (bb_upper - bb_lower) if (bb_upper - bb_lower) != 0 else 0.5
         
-        # Moving average crossovers
-        sma_20_50 = 1.0 if np.mean(closes[i-19:i+1]) > np.mean(closes[i-49:i+1]) else 0.0
-        sma_50_200 = 1.0 if np.mean(closes[i-49:i+1]) > np.mean(closes[i-199:i+1]) else 0.0
+        # Moving average crossovers (compared on the shifted means)
+        sma_20_50 = 1.0 if sum20 / 20 > sum50 / 50 else 0.0
+        sma_50_200 = 1.0 if sum50 / 50 > sum200 / 200 else 0.0
         
         # Momentum
-        momentum = (closes[i] - closes[i-10]) / closes[i-10] if closes[i-10] != 0 else 0
+        momentum = (closes[i] - closes[i-10]) / closes[i-10] if closes[i-10] != 0 else 0.0
         
         # Volume ratio
-        vol_ratio = volumes[i] / np.mean(volumes[i-19:i+1]) if np.mean(volumes[i-19:i+1]) != 0 else 1.0
+        vol_avg = vol_sum20 / 20
+        vol_ratio = volumes[i] / vol_avg if vol_nonzero20 != 0 else 1.0
         
         # ATR (Average True Range)
         tr = max(highs[i] - lows[i], abs(highs[i] - closes[i-1]), abs(lows[i] - closes[i-1]))
-        atr = tr / closes[i] if closes[i] != 0 else 0
+        atr = tr / closes[i] if closes[i] != 0 else 0.0
         
         # Stochastic Oscillator
-        high_14 = np.max(highs[i-13:i+1])
-        low_14 = np.min(lows[i-13:i+1])
-        stochastic = ((closes[i] - low_14) / (high_14 - low_14)) * 100 if (high_14 - low_14) != 0 else 50
+        while max_tail > max_head and highs[max_q[max_tail - 1]] <= highs[i]:
+            max_tail -= 1
+        max_q[max_tail] = i
+        max_tail += 1
+        if max_q[max_head] <= i - 14:
+            max_head += 1
+        while min_tail > min_head and lows[min_q[min_tail - 1]] >= lows[i]:
+            min_tail -= 1
+        min_q[min_tail] = i
+        min_tail += 1
+        if min_q[min_head] <= i - 14:
+            min_head += 1
+        high_14 = highs[max_q[max_head]]
+        low_14 = lows[min_q[min_head]]
+        stochastic = ((closes[i] - low_14) / (high_14 - low_14)) * 100 if (high_14 - low_14) != 0 else 50.0
         
         # OBV Momentum  
-        obv_change = (volumes[i] - volumes[i-5]) / volumes[i-5] if volumes[i-5] != 0 else 0
+        obv_change = (volumes[i] - volumes[i-5]) / volumes[i-5] if volumes[i-5] != 0 else 0.0
         
-        features.append([
-            rsi, macd, bb_width, bb_position,
-            sma_20_50, sma_50_200, momentum, vol_ratio,
-            atr, stochastic / 100, obv_change
-        ])
+        row = out[i - 200]
+        row[0] = rsi
+        row[1] = macd
+        row[2] = bb_width
+        row[3] = bb_position
+        row[4] = sma_20_50
+        row[5] = sma_50_200
+        row[6] = momentum
+        row[7] = vol_ratio
+        row[8] = atr
+        row[9] = stochastic / 100
+        row[10] = obv_change
+    
+    return out
+
+def calculate_features(ohlcv):
+    """Calculate 11 technical indicators"""
+    closes = np.ascontiguousarray(ohlcv[:, 3])
+    highs = np.ascontiguousarray(ohlcv[:, 1])
+    lows = np.ascontiguousarray(ohlcv[:, 2])
+    volumes = np.ascontiguousarray(ohlcv[:, 4])
     
-    return np.array(features)
+    return _compute_features_njit(highs, lows, closes, volumes)
 
 def create_labels(closes, lookahead_candles):
     """Create labels for a specific timeframe"""
@@ -130,24 +283,32 @@ def create_labels(closes, lookahead_candles):
     
     return np.array(labels)
 
-def train_model(asset, timeframe):
-    """Train model for specific asset and timeframe"""
+def prepare_asset(asset):
+    """Fetch data and compute the feature matrix shared by all timeframes"""
     print(f"\n{'='*60}")
-    print(f"Training {asset} - {timeframe} model")
+    print(f"Preparing {asset} data")
     print(f"{'='*60}")
     
     # Fetch data
     print(f"📊 Fetching {asset}USDT data...")
     ohlcv = fetch_binance_data(asset)
     
-    # Calculate features
+    # Calculate features (float32 once, so no fit has to downcast its copy)
     print(f"🔢 Calculating features...")
-    features = calculate_features(ohlcv)
+    features = calculate_features(ohlcv).astype(np.float32)
+    
+    return features, ohlcv[:, 3]
+
+def train_for_timeframe(asset, features, closes, timeframe):
+    """Train model for specific asset and timeframe"""
+    print(f"\n{'='*60}")
+    print(f"Training {asset} - {timeframe} model")
+    print(f"{'='*60}")
     
     # Create labels for this timeframe
     lookahead = TIMEFRAMES[timeframe]
     print(f"🎯 Creating labels (lookahead: {lookahead} candles = {timeframe})...")
-    labels = create_labels(ohlcv[:, 3], lookahead)
+    labels = create_labels(closes, lookahead)
     
     # Align features and labels
     min_len = min(len(features), len(labels))
@@ -157,14 +318,14 @@ def train_model(asset, timeframe):
     print(f"✅ Dataset: {len(X)} samples with 11 features")
     print(f"   Class distribution: SELL={np.sum(y==0)}, HOLD={np.sum(y==1)}, BUY={np.sum(y==2)}")
     
-    # Train Random Forest
-    print(f"🌲 Training Random Forest...")
-    model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=12,
-        min_samples_split=10,
-        random_state=42,
-        n_jobs=-1
+    # Train histogram gradient boosting (features binned to uint8 before splitting)
+    print(f"🌲 Training Gradient Boosting...")
+    model = HistGradientBoostingClassifier(
+        max_iter=200,
+        max_depth=8,
+        learning_rate=0.05,
+        early_stopping=True,
+        random_state=42
     )
     
     model.fit(X, y)
@@ -173,16 +334,46 @@ def train_model(asset, timeframe):
     train_accuracy = model.score(X, y)
     print(f"   Training Accuracy: {train_accuracy*100:.1f}%")
     
-    # Save model
-    model_path = f"models/{asset.lower()}_signal_{timeframe}.bin"
+    # Save model as ONNX (tensor outputs: label + probabilities, no ZipMap)
+    model_path = f"models/{asset.lower()}_signal_{timeframe}.onnx"
     os.makedirs('models', exist_ok=True)
-    joblib.dump(model, model_path)
+    _patch_hgb_converter()
+    initial_type = [('input', FloatTensorType([None, 11]))]
+    onnx_model = convert_sklearn(model, initial_types=initial_type,
+                                 options={id(model): {'zipmap': False}})
+    with open(model_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
     
     print(f"💾 Saved: {model_path}")
     print(f"✅ {asset} {timeframe} model complete!")
     
     return model_path, train_accuracy
 
+def prepare_and_train_all_timeframes(asset):
+    """Train every timeframe of one asset (runs in its own worker process)"""
+    results = []
+    
+    # Features only depend on the asset; each timeframe just relabels
+    try:
+        features, closes = prepare_asset(asset)
+    except Exception as e:
+        print(f"❌ Failed to prepare {asset}: {e}")
+        return results
+    
+    for timeframe in TIMEFRAMES.keys():
+        try:
+            model_path, accuracy = train_for_timeframe(asset, features, closes, timeframe)
+            results.append({
+                'asset': asset,
+                'timeframe': timeframe,
+                'path': model_path,
+                'accuracy': accuracy
+            })
+        except Exception as e:
+            print(f"❌ Failed to train {asset} {timeframe}: {e}")
+    
+    return results
+
 def main():
     """Train all 24 models"""
     print("Multi-Timeframe Model Training")
@@ -190,20 +381,11 @@ def main():
     print(f"   Timeframes: {len(TIMEFRAMES)}")
     print(f"   Total Models: {len(ASSETS) * len(TIMEFRAMES)}")
     
-    results = []
-    
-    for asset in ASSETS:
-        for timeframe in TIMEFRAMES.keys():
-            try:
-                model_path, accuracy = train_model(asset, timeframe)
-                results.append({
-                    'asset': asset,
-                    'timeframe': timeframe,
-                    'path': model_path,
-                    'accuracy': accuracy
-                })
-            except Exception as e:
-                print(f"❌ Failed to train {asset} {timeframe}: {e}")
+    # One process per asset so fetches, feature passes and fits overlap
+    per_asset = Parallel(n_jobs=len(ASSETS), backend='loky')(
+        delayed(prepare_and_train_all_timeframes)(asset) for asset in ASSETS
+    )
+    results = [r for asset_results in per_asset for r in asset_results]
     
     print(f"\n{'='*60}")
     print("📊 Training Summary")
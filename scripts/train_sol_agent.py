@@ -1,13 +1,19 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import TensorDataset, DataLoader
+from torch.utils.data.distributed import DistributedSampler
 import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import time
 import sys
+from compile_utils import maybe_compile
 
 # Fix Unicode encoding issue for Windows
 if sys.platform == 'win32':
@@ -20,12 +26,17 @@ INTERVAL = "1h"  # 1 Hour candles
 LIMIT = 2000     # Last 2000 hours (~83 days) for better training
 SEQ_LENGTH = 30  # Look back 30 hours (Must match OracleScheduler)
 HIDDEN_SIZE = 64
-EPOCHS = 2000   # Production quality training
+EPOCHS = 200    # Production quality training (mini-batch, ~30 steps per epoch)
+BATCH_SIZE = 64
 # User asked for "after 1 hour training". We will simulate "intense training".
 MODEL_PATH = "models/sol_v1.onnx"
 DIST_PATH = "dist/models/sol_v1.onnx"
 RPC_URL = "http://localhost:9000"
 
+# Shared keep-alive session: Binance calls reuse one TCP/TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 # === 1. Data Fetching ===
 def fetch_binance_data():
     url = "https://api.binance.com/api/v3/klines"
@@ -33,7 +44,7 @@ def fetch_binance_data():
     print(f"Fetching {LIMIT} candles ({INTERVAL}) for {SYMBOL}...")
     
     try:
-        resp = requests.get(url, params=params)
+        resp = _session.get(url, params=params)
         resp.raise_for_status()
         data = resp.json()
         df = pd.DataFrame(data, columns=["Open Time", "Open", "High", "Low", "Close", "Volume", "Close Time", "QAV", "Num Trades", "Taker Buy Base", "Taker Buy Quote", "Ignore"])
@@ -52,13 +63,12 @@ class StandardScaler:
         return (data - self.mean) / self.std
 
 def create_sequences(data, seq_length):
-    xs, ys = [], []
-    for i in range(len(data) - seq_length):
-        x = data[i:i+seq_length]
-        y = data[i+seq_length][0] 
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    # Sliding windows over time: X[i] = data[i:i+seq_length], y[i] = next Close
+    # Returned as contiguous float32 so torch.from_numpy can wrap them without a copy
+    windows = np.lib.stride_tricks.sliding_window_view(data, (seq_length, data.shape[1]))[:-1, 0]
+    X = np.ascontiguousarray(windows, dtype=np.float32)
+    y = np.ascontiguousarray(data[seq_length:, 0:1], dtype=np.float32)
+    return X, y
 
 # === 3. Model Definition ===
 class CryptoLSTM(nn.Module):
@@ -92,38 +102,85 @@ def mint_to_admin():
     except Exception as e:
         print(f"Minting Failed: {e}")
 
+# === Distributed Setup ===
+def setup_distributed():
+    """Join the process group when launched via torchrun; returns (rank, world_size, device)."""
+    use_cuda = torch.cuda.is_available()
+    if "LOCAL_RANK" not in os.environ:
+        return 0, 1, torch.device('cuda' if use_cuda else 'cpu')
+    
+    dist.init_process_group("nccl" if use_cuda else "gloo")
+    local_rank = int(os.environ["LOCAL_RANK"])
+    if use_cuda:
+        torch.cuda.set_device(local_rank)
+        device = torch.device('cuda', local_rank)
+    else:
+        device = torch.device('cpu')
+    return dist.get_rank(), dist.get_world_size(), device
+
 # === Main ===
+# Single process: python scripts/train_sol_agent.py
+# Multi-worker:   torchrun --nproc_per_node=N scripts/train_sol_agent.py
 def main():
-    print(f"Starting SOL AI Agent Training Session ({EPOCHS} Epochs)...")
+    rank, world_size, device = setup_distributed()
+    is_main = rank == 0
+    if is_main:
+        print(f"Starting SOL AI Agent Training Session ({EPOCHS} Epochs, {world_size} worker(s))...")
     
-    # A. Prepare Data
-    raw_data = fetch_binance_data()
+    # A. Prepare Data (rank 0 downloads, every worker trains on the same candles)
+    raw_data = fetch_binance_data() if is_main else None
+    if world_size > 1:
+        shared = [raw_data]
+        dist.broadcast_object_list(shared, src=0)
+        raw_data = shared[0]
     scaler = StandardScaler()
     scaled_data = scaler.fit_transform(raw_data)
     X, y = create_sequences(scaled_data, SEQ_LENGTH)
     
-    X_tensor = torch.FloatTensor(X)
-    y_tensor = torch.FloatTensor(y).view(-1, 1)
+    print(f"[rank {rank}] Using device: {device}")
+    X_tensor = torch.from_numpy(X).to(device, non_blocking=True)
+    y_tensor = torch.from_numpy(y).to(device, non_blocking=True)
     
     # B. Train
-    model = CryptoLSTM(hidden_size=HIDDEN_SIZE)
+    model = CryptoLSTM(hidden_size=HIDDEN_SIZE).to(device)
+    # DDP/compiled wrappers share parameters with `model`; ONNX export uses the eager module
+    train_model = model
+    if world_size > 1:
+        train_model = DDP(model, device_ids=[device.index] if device.type == 'cuda' else None)
+    compiled_model = maybe_compile(train_model, device)
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(), lr=0.001)
     
     start_time = time.time()
     
+    dataset = TensorDataset(X_tensor, y_tensor)
+    # Each worker gets its own shard of the (shuffled) dataset per epoch
+    sampler = DistributedSampler(dataset) if world_size > 1 else None
+    # Full batches only: a short last batch would capture a second compiled graph
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=(sampler is None), sampler=sampler,
+                        drop_last=True)
+
     for epoch in range(EPOCHS):
+        if sampler is not None:
+            sampler.set_epoch(epoch)
         model.train()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        
-        if (epoch+1) % 100 == 0:
+        epoch_loss = 0.0
+        for xb, yb in loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(compiled_model(xb), yb)
+            loss.backward()
+            optimizer.step()
+            epoch_loss += loss.item()
+        epoch_loss /= len(loader)
+
+        if is_main and (epoch+1) % 20 == 0:
             elapsed = time.time() - start_time
-            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {loss.item():.6f}, Time: {elapsed:.1f}s", flush=True)
+            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {epoch_loss:.6f}, Time: {elapsed:.1f}s", flush=True)
+
+    if world_size > 1:
+        dist.destroy_process_group()
+    if not is_main:
+        return
 
     print("Training Complete.", flush=True)
 
@@ -144,7 +201,7 @@ def main():
 
     # D. Export ONNX
     dummy_input = torch.randn(1, SEQ_LENGTH, 2)
-    model.eval()  # Set to eval mode for export
+    model.cpu().eval()  # Device-agnostic graph; eval mode for export
     
     # Suppress verbose ONNX export output to avoid Unicode errors
     import logging
@@ -156,10 +213,13 @@ def main():
             dummy_input, 
             MODEL_PATH,
             export_params=True,
-            opset_version=12,
+            opset_version=17,
             do_constant_folding=True,
+            training=torch.onnx.TrainingMode.EVAL,
             input_names=['input'],
             output_names=['output'],
+            # Dynamic batch: the backtest scores every window in one run
+            dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
             verbose=False  # Disable verbose output
         )
         shutil.copy(MODEL_PATH, DIST_PATH)
@@ -1,12 +1,23 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
+from torch.utils.data import TensorDataset, DataLoader
 import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import math
+from compile_utils import maybe_compile
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional: fall back to plain Python loops
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
 
 # === Configuration ===
 SYMBOL = "BTCUSDT"
@@ -17,32 +28,55 @@ D_MODEL = 64    # Embedding dimension
 NHEAD = 4       # Attention heads
 NUM_LAYERS = 2  # Transformer layers
 EPOCHS = 50
+BATCH_SIZE = 64
 MODEL_PATH = "models/model_transformer_v1.onnx"
 
+# Shared keep-alive session: Binance calls reuse one TCP/TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
+
 # === 1. Data Fetching (Enhanced) ===
+@njit(cache=True)
+def rsi14(close):
+    """Simple 14-period RSI (rolling mean of gains/losses), neutral 50 until warmed up."""
+    n = len(close)
+    out = np.full(n, 50.0)
+    ring_gain = np.zeros(14)
+    ring_loss = np.zeros(14)
+    gain_sum = 0.0
+    loss_sum = 0.0
+    for i in range(1, n):
+        delta = close[i] - close[i - 1]
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        slot = i % 14
+        gain_sum += gain - ring_gain[slot]
+        loss_sum += loss - ring_loss[slot]
+        ring_gain[slot] = gain
+        ring_loss[slot] = loss
+        if i >= 13:
+            if loss_sum <= 0.0:
+                out[i] = 100.0 if gain_sum > 0.0 else 50.0
+            else:
+                out[i] = 100.0 - 100.0 / (1.0 + gain_sum / loss_sum)
+    return out
+
 def fetch_binance_data():
     url = "https://api.binance.com/api/v3/klines"
     params = {"symbol": SYMBOL, "interval": INTERVAL, "limit": LIMIT}
     print(f"Dataset: Fetching {LIMIT} candles ({INTERVAL}) for {SYMBOL}...")
     
     try:
-        resp = requests.get(url, params=params)
+        resp = _session.get(url, params=params)
         resp.raise_for_status()
         data = resp.json()
         df = pd.DataFrame(data, columns=["Open Time", "Open", "High", "Low", "Close", "Volume", "Close Time", "QAV", "Num Trades", "Taker Buy Base", "Taker Buy Quote", "Ignore"])
         
-        df["Close"] = df["Close"].astype(float)
-        df["Volume"] = df["Volume"].astype(float)
+        close = df["Close"].astype(float).values
+        volume = df["Volume"].astype(float).values
         
         # Simple RSI Feature
-        delta = df["Close"].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df["RSI"] = 100 - (100 / (1 + rs))
-        df["RSI"] = df["RSI"].fillna(50) # Fill NaN with neutral RSI
-        
-        return df[["Close", "Volume", "RSI"]].values # Shape: (N, 3)
+        return np.column_stack((close, volume, rsi14(close))) # Shape: (N, 3)
     except Exception as e:
         print(f"❌ Error fetching data: {e}")
         return np.random.rand(LIMIT, 3)
@@ -59,13 +93,9 @@ class StandardScaler:
         return (data * self.std[0]) + self.mean[0]
 
 def create_sequences(data, seq_length):
-    xs, ys = [], []
-    for i in range(len(data) - seq_length):
-        x = data[i:i+seq_length]
-        y = data[i+seq_length][0] 
-        xs.append(x)
-        ys.append(y)
-    return np.array(xs), np.array(ys)
+    # Sliding windows over time: X[i] = data[i:i+seq_length], y[i] = next Close
+    windows = np.lib.stride_tricks.sliding_window_view(data, (seq_length, data.shape[1]))[:-1, 0]
+    return np.ascontiguousarray(windows), data[seq_length:, 0]
 
 # === 3. Transformer Model ===
 class PositionalEncoding(nn.Module):
@@ -76,11 +106,12 @@ class PositionalEncoding(nn.Module):
         div_term = torch.exp(torch.arange(0, d_model, 2).float() * (-math.log(10000.0) / d_model))
         pe[:, 0::2] = torch.sin(position * div_term)
         pe[:, 1::2] = torch.cos(position * div_term)
-        pe = pe.unsqueeze(0).transpose(0, 1)
+        pe = pe.unsqueeze(0) # (1, max_len, d_model): broadcasts over batch-first input
         self.register_buffer('pe', pe)
 
     def forward(self, x):
-        return x + self.pe[:x.size(0), :]
+        # x: (Batch, Seq_Len, d_model)
+        return x + self.pe[:, :x.size(1), :]
 
 class TimeSeriesTransformer(nn.Module):
     def __init__(self, input_size=3, d_model=64, nhead=4, num_layers=2):
@@ -98,12 +129,7 @@ class TimeSeriesTransformer(nn.Module):
         # x: (Batch, Seq_Len, Features)
         x = self.embedding(x)
         x = x * math.sqrt(D_MODEL) 
-        # For batch_first=True, we don't need to transpose for pos_encoder if we adjust usage, 
-        # but typical PosEncoding expects (Seq, Batch, Dim). Let's be careful.
-        # Actually PyTorch Transformer batch_first=True handles (Batch, Seq, Dim).
-        # Our PosEncoder above expects (Seq, Batch, Dim). Keep it simple for now:
-        
-        x = self.pos_encoder(x.permute(1, 0, 2)).permute(1, 0, 2)
+        x = self.pos_encoder(x)
         
         output = self.transformer_encoder(x)
         
@@ -121,27 +147,46 @@ def main():
     
     X, y = create_sequences(scaled_data, SEQ_LENGTH)
     
-    X_tensor = torch.FloatTensor(X)
-    y_tensor = torch.FloatTensor(y).view(-1, 1)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+    X_tensor = torch.FloatTensor(X).to(device, non_blocking=True)
+    y_tensor = torch.FloatTensor(y).view(-1, 1).to(device, non_blocking=True)
     
     # B. Train
     print("[INFO] Initializing Transformer (2025 Architecture)...")
-    model = TimeSeriesTransformer(input_size=3, d_model=D_MODEL, nhead=NHEAD, num_layers=NUM_LAYERS)
+    model = TimeSeriesTransformer(input_size=3, d_model=D_MODEL, nhead=NHEAD, num_layers=NUM_LAYERS).to(device)
+    # Compiled wrapper shares parameters with `model`; ONNX export uses the eager module
+    compiled_model = maybe_compile(model, device)
+    if not hasattr(torch, "compile"):
+        # No Dynamo (PyTorch < 2.0): at least script the per-step positional encoding lookup
+        model.pos_encoder = torch.jit.script(model.pos_encoder)
     criterion = nn.MSELoss()
     optimizer = optim.Adam(model.parameters(), lr=0.0005)
     
+    # Mixed precision: bf16 where supported (no loss scaling needed), else fp16 + GradScaler
+    amp_dtype = torch.bfloat16 if device.type == 'cpu' or torch.cuda.is_bf16_supported() else torch.float16
+    grad_scaler = torch.amp.GradScaler('cuda', enabled=(amp_dtype == torch.float16))
+    
     print("[INFO] Training...")
+    dataset = TensorDataset(X_tensor, y_tensor)
+    # Full batches only: a short last batch would capture a second compiled graph
+    loader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True, drop_last=True)
+
     for epoch in range(EPOCHS):
         model.train()
-        outputs = model(X_tensor)
-        loss = criterion(outputs, y_tensor)
-        
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        
+        epoch_loss = 0.0
+        for xb, yb in loader:
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(device_type=device.type, dtype=amp_dtype):
+                loss = criterion(compiled_model(xb), yb)
+            grad_scaler.scale(loss).backward()
+            grad_scaler.step(optimizer)
+            grad_scaler.update()
+            epoch_loss += loss.item()
+        epoch_loss /= len(loader)
+
         if (epoch+1) % 10 == 0:
-            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {loss.item():.6f}")
+            print(f"Epoch [{epoch+1}/{EPOCHS}], Loss: {epoch_loss:.6f}")
 
     print("✅ Training Complete.")
 
@@ -152,9 +197,14 @@ def main():
     dummy_input = torch.randn(1, SEQ_LENGTH, 3) 
     
     # Export with dynamic axes for batch size
+    model.cpu().eval()
     torch.onnx.export(model, 
                       dummy_input, 
                       MODEL_PATH, 
+                      export_params=True,
+                      opset_version=17,
+                      do_constant_folding=True,
+                      training=torch.onnx.TrainingMode.EVAL,
                       input_names=['input'], 
                       output_names=['output'],
                       dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}})
@@ -1,75 +1,194 @@
 import numpy as np
-import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+import hashlib
 import json
+import logging
 import os
-from sklearn.ensemble import GradientBoostingRegressor
-from skl2onnx import convert_sklearn
-from skl2onnx.common.data_types import FloatTensorType
+import sys
+import threading
+import time
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: fall back to the stdlib json decoder
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:  # xxhash is optional: fall back to the stdlib blake2b digest
+    xxhash = None
+
+# One stderr handler, same "[LEVEL] message" lines the script has always printed
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s', stream=sys.stderr)
 
 # === Configuration ===
 SYMBOL = "SOLUSDT" # Train Gradient Boosting for SOL
 INTERVAL = "1h"
 LIMIT = 2000
 MODEL_PATH = "models/model_xgboost_v1.onnx"
+BOOSTER_PATH = "models/model_xgboost_v1.json"
+HASH_PATH = MODEL_PATH + ".hash"
+CACHE_DIR = "cache"
+
+# Shared keep-alive session: periodic retrains reuse one TLS connection
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=2))
 
 # === 1. Fetch Data ===
 def fetch_binance_data():
     url = "https://api.binance.com/api/v3/klines"
     params = {"symbol": SYMBOL, "interval": INTERVAL, "limit": LIMIT}
-    print(f"[INFO] Fetching {LIMIT} candles ({INTERVAL}) for {SYMBOL}...")
+    logging.info(f"Fetching {LIMIT} candles ({INTERVAL}) for {SYMBOL}...")
+    
+    # Raw responses are cached per hour, so re-runs within the hour skip the network
+    bucket = int(time.time()) // 3600
+    cache_path = os.path.join(CACHE_DIR, f"{SYMBOL}_{INTERVAL}_{LIMIT}_{bucket}.json")
     
     try:
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        df = pd.DataFrame(data, columns=["Open Time", "Open", "High", "Low", "Close", "Volume", "Close Time", "QAV", "Num Trades", "Taker Buy Base", "Taker Buy Quote", "Ignore"])
-        
-        df["Close"] = df["Close"].astype(float)
+        if os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                raw = f.read()
+        else:
+            resp = _session.get(url, params=params, timeout=10)
+            resp.raise_for_status()
+            raw = resp.content
+            # Write then rename, so a crash never leaves a truncated cache file
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, cache_path)
+        data = orjson.loads(raw) if orjson else json.loads(raw)
+        # Kline rows are [Open Time, Open, High, Low, Close, Volume, ...]; only Close is used,
+        # cast once straight to float32 so every later step stays single precision
+        closes = np.asarray(data, dtype=object)[:, 4].astype(np.float32)
         
-        # Feature Engineering (Lag Features)
-        df['Return'] = df['Close'].pct_change()
+        # Feature Engineering (Lag Features): simple returns, X and y both view this one buffer
+        ret = closes[1:] / closes[:-1]
+        ret -= 1
         
-        # Lag Features (Last 5 hours)
-        for i in range(1, 6):
-            df[f'Lag_{i}'] = df['Return'].shift(i)
-            
-        df = df.dropna()
+        # Lag Features (Last 5 hours): window row j is ret[j:j+6], one strided view
+        windows = sliding_window_view(ret, 6)
         
-        # Input: [Lag_1, Lag_2, Lag_3, Lag_4, Lag_5]
+        # Input: [Lag_1, Lag_2, Lag_3, Lag_4, Lag_5] (newest first)
         # Target: Next Return
-        features = [f'Lag_{i}' for i in range(1, 6)]
-        X = df[features].values.astype(np.float32) # Ensure Float32
-        y = df['Return'].shift(-1).dropna().values.astype(np.float32)
-        X = X[:-1] 
+        X = np.ascontiguousarray(windows[:-1, 4::-1])
+        y = ret[6:]
         
         return X, y
         
     except Exception as e:
-        print(f"[ERROR] Fetch failed: {e}")
+        logging.error(f"Fetch failed: {e}")
         return np.random.rand(100, 5).astype(np.float32), np.random.rand(100).astype(np.float32)
 
-# === 2. Train ===
+def dataset_digest(X, y):
+    """Content hash of the training arrays, used to skip retraining on unchanged data"""
+    h = xxhash.xxh3_64() if xxhash else hashlib.blake2b(digest_size=16)
+    h.update(X.tobytes())
+    h.update(y.tobytes())
+    return h.hexdigest()
+
+# === 2. ONNX Export ===
+def build_onnx(booster_path):
+    """Emit a saved booster's trees as a single TreeEnsembleRegressor node (input float_input [None, 5])"""
+    from onnx import helper, TensorProto
+    
+    with open(booster_path, "rb") as f:
+        raw = f.read()
+    learner = (orjson.loads(raw) if orjson else json.loads(raw))["learner"]
+    # Stored as a one-element vector literal, e.g. "[1.0085443E-2]"
+    base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+    
+    # Each saved tree is a set of per-node arrays (node id = array index), so
+    # the ONNX attributes are assembled tree-at-a-time with NumPy
+    nodes = {key: [] for key in ("treeids", "nodeids", "featureids", "modes", "values",
+                                 "truenodeids", "falsenodeids", "missing_value_tracks_true")}
+    targets = {key: [] for key in ("treeids", "nodeids", "ids", "weights")}
+    for tree_id, tree in enumerate(learner["gradient_booster"]["model"]["trees"]):
+        left = np.asarray(tree["left_children"])
+        right = np.asarray(tree["right_children"])
+        # Branches send x < split_condition to the left child; on leaves the
+        # same slot holds the leaf value
+        condition = np.asarray(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left == -1
+        node_ids = np.arange(len(left))
+        leaf_ids = node_ids[is_leaf]
+        
+        nodes["treeids"].append(np.full(len(left), tree_id))
+        nodes["nodeids"].append(node_ids)
+        nodes["featureids"].append(np.where(is_leaf, 0, tree["split_indices"]))
+        nodes["modes"].append(np.where(is_leaf, "LEAF", "BRANCH_LT"))
+        nodes["values"].append(np.where(is_leaf, 0, condition))
+        nodes["truenodeids"].append(np.where(is_leaf, 0, left))
+        nodes["falsenodeids"].append(np.where(is_leaf, 0, right))
+        nodes["missing_value_tracks_true"].append(np.where(is_leaf, 0, tree["default_left"]))
+        targets["treeids"].append(np.full(len(leaf_ids), tree_id))
+        targets["nodeids"].append(leaf_ids)
+        targets["ids"].append(np.zeros(len(leaf_ids), dtype=int))
+        targets["weights"].append(condition[is_leaf])
+    nodes = {key: np.concatenate(parts).tolist() for key, parts in nodes.items()}
+    targets = {key: np.concatenate(parts).tolist() for key, parts in targets.items()}
+    
+    ensemble = helper.make_node(
+        "TreeEnsembleRegressor", ["float_input"], ["variable"], domain="ai.onnx.ml",
+        n_targets=1, base_values=[base_score], post_transform="NONE",
+        **{f"nodes_{key}": values for key, values in nodes.items()},
+        **{f"target_{key}": values for key, values in targets.items()},
+    )
+    graph = helper.make_graph(
+        [ensemble], "model_xgboost_v1",
+        [helper.make_tensor_value_info("float_input", TensorProto.FLOAT, [None, 5])],
+        [helper.make_tensor_value_info("variable", TensorProto.FLOAT, [None, 1])],
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 15), helper.make_opsetid("ai.onnx.ml", 1)],
+                             ir_version=7)
+
+# === 3. Train ===
+def preload_modules():
+    """Import xgboost and onnx ahead of use (about a second cold, mostly xgboost)"""
+    import xgboost  # noqa: F401
+    import onnx  # noqa: F401
+
 def main():
+    # Heavy imports run in the background while the klines download
+    preload = threading.Thread(target=preload_modules, daemon=True)
+    preload.start()
     X, y = fetch_binance_data()
     
-    print("[INFO] Training Gradient Boosting Agent...")
-    model = GradientBoostingRegressor(n_estimators=100, max_depth=3, learning_rate=0.1)
+    # Same features as the model on disk was trained on: nothing to do
+    digest = dataset_digest(X, y)
+    if os.path.exists(MODEL_PATH) and os.path.exists(HASH_PATH):
+        with open(HASH_PATH) as f:
+            if f.read().strip() == digest:
+                logging.info(f"Data unchanged, keeping {MODEL_PATH}")
+                return
+    
+    preload.join()
+    import xgboost as xgb
+    
+    logging.info("Training Gradient Boosting Agent...")
+    # Multithreaded C++ histogram GBDT (features binned once, splits over the bins)
+    model = xgb.XGBRegressor(n_estimators=100, max_depth=3, learning_rate=0.1, tree_method='hist', n_jobs=-1)
     model.fit(X, y)
     
-    print("[INFO] Training Complete. MSE:", np.mean((model.predict(X) - y)**2))
+    logging.info(f"Training Complete. MSE: {np.mean((model.predict(X) - y)**2)}")
     
-    # === 3. Export to ONNX ===
+    # === 4. Export to ONNX ===
     if not os.path.exists("models"):
         os.makedirs("models")
         
-    initial_type = [('float_input', FloatTensorType([None, 5]))]
-    onnx_model = convert_sklearn(model, initial_types=initial_type)
+    # Persist the native booster first; the ONNX graph is built from that file
+    model.save_model(BOOSTER_PATH)
+    onnx_model = build_onnx(BOOSTER_PATH)
     
     with open(MODEL_PATH, "wb") as f:
         f.write(onnx_model.SerializeToString())
+    with open(HASH_PATH, "w") as f:
+        f.write(digest)
         
-    print(f"[INFO] Model MINTED: {MODEL_PATH}")
+    logging.info(f"Model MINTED: {MODEL_PATH}")
 
 if __name__ == "__main__":
     main()
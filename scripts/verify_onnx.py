@@ -1,31 +1,62 @@
+import os
+import sys
+
+# Single-threaded, spinning OpenMP workers: must be set before onnxruntime loads
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("OMP_WAIT_POLICY", "ACTIVE")
+
 import onnxruntime as ort
 import numpy as np
 
 def verify_model():
     model_path = "models/price_decision_v1.onnx"
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.intra_op_num_threads = 1
+    so.inter_op_num_threads = 1
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
     try:
-        session = ort.InferenceSession(model_path)
+        session = ort.InferenceSession(model_path, sess_options=so, providers=['CPUExecutionProvider'])
     except Exception as e:
-        print(f"Failed to load model: {e}")
+        print(f"Failed to load model: {e}", file=sys.stderr)
         return
 
     input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
     
-    # Test Input 1: 50000.0
-    val1 = np.array([[50000.0]], dtype=np.float32)
-    res1 = session.run(None, {input_name: val1})[0]
+    # Bind preallocated OrtValues once, so there is no per-call input copy or
+    # output allocation. On CPU the input OrtValue wraps `buf` without copying:
+    # writing into `buf` is the input. Both test inputs go in one (2, 1) batch
+    # (the batch dimension is dynamic).
+    buf = np.zeros((2, 1), dtype=np.float32)
+    in_ort = ort.OrtValue.ortvalue_from_numpy(buf)
+    out_ort = ort.OrtValue.ortvalue_from_shape_and_type([2, 1], np.float32)
+    io = session.io_binding()
+    io.bind_ortvalue_input(input_name, in_ort)
+    io.bind_ortvalue_output(output_name, out_ort)
     
-    # Test Input 2: 100000.0
-    val2 = np.array([[100000.0]], dtype=np.float32)
-    res2 = session.run(None, {input_name: val2})[0]
+    # Warm-up: first run allocates the memory arena, keep it out of the checks
+    session.run_with_iobinding(io)
     
-    print(f"Input: 50000.0 -> Output: {res1}")
-    print(f"Input: 100000.0 -> Output: {res2}")
+    # Test Inputs: 50000.0 and 100000.0
+    buf[0, 0] = 50000.0
+    buf[1, 0] = 100000.0
+    session.run_with_iobinding(io)
+    res = out_ort.numpy()
+    res1, res2 = res[0:1], res[1:2]
+    
+    lines = [
+        f"Input: 50000.0 -> Output: {res1}",
+        f"Input: 100000.0 -> Output: {res2}",
+    ]
     
     if np.allclose(res1, res2):
-        print("❌ MODEL FAILURE: Outputs are identical! Model is creating constant predictions.")
+        lines.append("❌ MODEL FAILURE: Outputs are identical! Model is creating constant predictions.")
     else:
-        print("✅ MODEL OK: Outputs vary with input.")
+        lines.append("✅ MODEL OK: Outputs vary with input.")
+    
+    # One buffered write for the whole report
+    sys.stderr.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     verify_model()